@@ -7,8 +7,8 @@ CREATE TABLE IF NOT EXISTS documents (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Create index on updated_at for efficient querying
-CREATE INDEX IF NOT EXISTS idx_documents_updated_at ON documents(updated_at);
+-- Create index on (updated_at, id) so somatic watch can page through changes by keyset
+CREATE INDEX IF NOT EXISTS idx_documents_updated_at_id ON documents(updated_at, id);
 
 -- Insert some test data
 INSERT INTO documents (title, content) VALUES
@@ -13,7 +13,6 @@ import sys
 from pathlib import Path
 from dotenv import load_dotenv
 import psycopg2
-from psycopg2.extras import RealDictCursor
 from openai import OpenAI
 from qdrant_client import QdrantClient
 from qdrant_client.models import Distance, VectorParams, PointStruct
@@ -51,16 +50,18 @@ def main():
     # Fetch one row
     print("\n📖 Fetching a row from documents table...")
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("SELECT * FROM documents LIMIT 1")
+        with conn.cursor() as cur:
+            cur.execute("SELECT id, title, content, created_at, updated_at FROM documents LIMIT 1")
             row = cur.fetchone()
             if not row:
                 print("❌ ERROR: No rows found in documents table")
                 sys.exit(1)
+            cols = {d.name: i for i, d in enumerate(cur.description)}
             
-            doc_id = row['id']
-            title = row.get('title', '')
-            content = row.get('content', '')
+            doc_id = row[cols['id']]
+            title = row[cols['title']] or ''
+            content = row[cols['content']] or ''
+            timestamp = row[cols['updated_at']] or row[cols['created_at']]
             print(f"✅ Fetched row ID: {doc_id}")
             print(f"   Title: {title[:50]}...")
             print(f"   Content: {content[:50]}...")
@@ -123,7 +124,7 @@ def main():
                 "row_id": doc_id,
                 "title": title,
                 "content": content,
-                "timestamp": row.get('updated_at', row.get('created_at'))
+                "timestamp": timestamp
             }
         )
         client.upsert(
@@ -175,33 +176,18 @@ def main():
         )
         search_embedding = search_response.data[0].embedding
         
-        # For local/embedded mode, Qdrant doesn't have a direct search() method
-        # Use scroll to get all points and calculate cosine similarity manually
-        all_points = client.scroll(
+        # Let Qdrant rank the stored points natively instead of pulling every
+        # vector across the client boundary and scoring it in Python
+        scored_points = client.query_points(
             collection_name=collection_name,
-            limit=100,
-            with_vectors=True,
+            query=search_embedding,
+            limit=5,
             with_payload=True
-        )[0]
-        
-        # Calculate cosine similarity manually
-        import math
-        def cosine_similarity(vec1, vec2):
-            dot_product = sum(a * b for a, b in zip(vec1, vec2))
-            magnitude1 = math.sqrt(sum(a * a for a in vec1))
-            magnitude2 = math.sqrt(sum(a * a for a in vec2))
-            return dot_product / (magnitude1 * magnitude2) if magnitude1 * magnitude2 > 0 else 0
-        
-        scored_points = []
-        for point in all_points:
-            if point.vector:
-                score = cosine_similarity(search_embedding, point.vector)
-                scored_points.append((score, point))
-        
-        scored_points.sort(key=lambda x: x[0], reverse=True)
+        ).points
         
         if scored_points:
-            result_score, result = scored_points[0]
+            result = scored_points[0]
+            result_score = result.score
             result_id = result.id
             result_payload = result.payload if hasattr(result, 'payload') else {}
             
@@ -1,11 +1,16 @@
 """Main CLI interface for Somatic"""
 
 import os
-import json
+import dataclasses
 import time
+import asyncio
+import hashlib
+import itertools
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterable, List, Optional, Tuple
 import click
+import orjson
+import numpy as np
 from rich.console import Console
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TimeElapsedColumn
 from rich.table import Table
@@ -16,6 +21,7 @@ from .config import load_config
 from .models import SomaticConfig, WatcherState
 from .watcher import DatabaseWatcher
 from .embedder import Embedder
+from .embedding_cache import EmbeddingCache
 from .storage import Storage
 from qdrant_client.models import PointStruct
 
@@ -25,20 +31,28 @@ load_dotenv()
 # Initialize rich console
 console = Console()
 
+# Rows handled per round of hash checks and upserts in watch
+WATCH_BATCH_SIZE = 100
+
 
 def get_state_path() -> Path:
     """Get path to state file"""
     return Path(".somatic") / "state.json"
 
 
+def get_cache_path() -> Path:
+    """Get path to embedding cache database"""
+    return Path(".somatic") / "embeddings.db"
+
+
 def load_state() -> WatcherState:
     """Load watcher state from file"""
     state_path = get_state_path()
     if state_path.exists():
         try:
-            with open(state_path, 'r') as f:
-                data = json.load(f)
-            return WatcherState(**data)
+            with open(state_path, 'rb') as f:
+                data = orjson.loads(f.read())
+            return WatcherState(**{field.name: data.get(field.name) for field in dataclasses.fields(WatcherState)})
         except Exception as e:
             logger.warning(f"Failed to load state: {e}")
             return WatcherState()
@@ -49,8 +63,177 @@ def save_state(state: WatcherState):
     """Save watcher state to file"""
     state_path = get_state_path()
     state_path.parent.mkdir(exist_ok=True, parents=True)
-    with open(state_path, 'w') as f:
-        json.dump(state.model_dump(), f, indent=2)
+    # Write to a temp file and rename so a crash never leaves a torn state file
+    tmp_path = state_path.with_suffix(".json.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(orjson.dumps(state, option=orjson.OPT_INDENT_2))
+    os.replace(tmp_path, state_path)
+
+
+def content_hash(model: str, text: str) -> str:
+    """Hash the embedding model and the full text a row was embedded from"""
+    return hashlib.sha256((model + "\0" + text).encode()).hexdigest()
+
+
+def build_point(row: dict, text: str, embedding: np.ndarray, somatic_config: SomaticConfig) -> PointStruct:
+    """Build a Qdrant point for a row, its untruncated text and its embedding"""
+    primary_key = row[somatic_config.watch.primary_key]
+    return PointStruct(
+        id=primary_key,
+        # PointStruct validates vectors as a list of floats
+        vector=embedding.tolist(),
+        payload={
+            "row_id": primary_key,
+            **{col: row.get(col) for col in somatic_config.watch.columns},
+            "timestamp": row.get(somatic_config.watch.updated_at_column),
+            # Hashing the text before truncation keeps edits past the token limit
+            # visible, and the model keeps a model change from reusing old vectors
+            "content_sha": content_hash(somatic_config.embeddings.model, text)
+        }
+    )
+
+
+async def run_sync_pipeline(
+    rows: Iterable[dict],
+    watcher: DatabaseWatcher,
+    embedder: Embedder,
+    storage: Storage,
+    somatic_config: SomaticConfig,
+    on_progress: Callable[[int], None],
+    batch_size: int = 100
+) -> Tuple[int, List[dict], Optional[dict]]:
+    """Embed and store rows through a fetch -> embed -> upsert pipeline
+    
+    Rows are fetched in batches by a producer, embedded by a pool of workers
+    (one in-flight API request each) and upserted by a single writer running
+    in a background thread, so embedding requests overlap with Qdrant writes.
+    Returns the number of rows seen, the rows that failed to process and the
+    last row produced.
+    """
+    workers = embedder.max_concurrency
+    primary_key = somatic_config.watch.primary_key
+    row_batches: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+    point_batches: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+    failed_rows = []
+    total = 0
+    last_row = None
+    
+    async def produce():
+        nonlocal total, last_row
+        row_iter = iter(rows)
+        # Pull each batch from the database cursor in a worker thread so
+        # fetching and decoding rows never blocks the event loop
+        while batch := await asyncio.to_thread(list, itertools.islice(row_iter, batch_size)):
+            total += len(batch)
+            last_row = batch[-1]
+            await row_batches.put(batch)
+        for _ in range(workers):
+            await row_batches.put(None)
+    
+    async def embed_rows_one_by_one(batch: List[dict]) -> Tuple[List[dict], List[PointStruct]]:
+        # Fallback for a failed batch, so only the rows that actually fail are lost
+        stored, points = [], []
+        for row in batch:
+            try:
+                [text] = watcher.format_rows([row])
+                [embedding] = await embedder.aembed_batch(watcher.truncate([text]))
+                points.append(build_point(row, text, embedding, somatic_config))
+                stored.append(row)
+            except Exception as e:
+                logger.error(f"Failed to process row {row.get(primary_key)}: {e}")
+                failed_rows.append(row)
+        return stored, points
+    
+    async def embed():
+        while (batch := await row_batches.get()) is not None:
+            try:
+                texts = watcher.format_rows(batch)
+                embeddings = await embedder.aembed_batch(watcher.truncate(texts), batch_size)
+                points = [
+                    build_point(row, text, embedding, somatic_config)
+                    for row, text, embedding in zip(batch, texts, embeddings)
+                ]
+                stored = batch
+            except Exception as e:
+                logger.warning(f"Failed to process batch starting at row {batch[0].get(primary_key)}, retrying rows one by one: {e}")
+                stored, points = await embed_rows_one_by_one(batch)
+            await point_batches.put((batch, stored, points))
+    
+    async def write():
+        while (item := await point_batches.get()) is not None:
+            batch, stored, points = item
+            try:
+                await asyncio.to_thread(storage.upsert, points)
+            except Exception as e:
+                logger.error(f"Failed to store batch starting at row {batch[0].get(primary_key)}: {e}")
+                failed_rows.extend(stored)
+            on_progress(len(batch))
+    
+    try:
+        writer = asyncio.create_task(write())
+        await asyncio.gather(produce(), *(embed() for _ in range(workers)))
+        await point_batches.put(None)
+        await writer
+    finally:
+        # The async client's connections belong to this event loop, which ends with the pipeline
+        await embedder.aclose()
+    return total, failed_rows, last_row
+
+
+def process_changed_rows(
+    rows: List[dict],
+    watcher: DatabaseWatcher,
+    embedder: Embedder,
+    storage: Storage,
+    somatic_config: SomaticConfig
+) -> Tuple[int, int]:
+    """Embed and upsert rows whose text changed since they were last embedded
+    
+    Returns the number of rows upserted and the number skipped as unchanged.
+    """
+    primary_key = somatic_config.watch.primary_key
+    model = somatic_config.embeddings.model
+    texts = dict(zip(
+        (row[primary_key] for row in rows),
+        watcher.format_rows(rows)
+    ))
+    
+    # Skip rows whose text is unchanged since they were last embedded
+    stored_hashes = storage.get_content_hashes(list(texts))
+    
+    changed = []
+    skipped = 0
+    for row in rows:
+        if stored_hashes.get(row[primary_key]) == content_hash(model, texts[row[primary_key]]):
+            skipped += 1
+        else:
+            changed.append(row)
+    
+    if not changed:
+        return 0, skipped
+    
+    # One embeddings request for all changed rows in the batch
+    changed_texts = [texts[row[primary_key]] for row in changed]
+    embed_texts = watcher.truncate(changed_texts)
+    try:
+        embeddings = embedder.embed_batch(embed_texts)
+        points = [
+            build_point(row, text, embedding, somatic_config)
+            for row, text, embedding in zip(changed, changed_texts, embeddings)
+        ]
+    except Exception as e:
+        # Retry row by row so only the rows that actually fail are lost
+        logger.warning(f"Failed to process rows starting at {changed[0].get(primary_key)}, retrying one by one: {e}")
+        points = []
+        for row, text, embed_text in zip(changed, changed_texts, embed_texts):
+            try:
+                points.append(build_point(row, text, embedder.embed(embed_text), somatic_config))
+            except Exception as e:
+                logger.error(f"Failed to process row {row.get(primary_key)}: {e}")
+    
+    # Upsert points
+    storage.upsert(points)
+    return len(points), skipped
 
 
 @click.group()
@@ -126,7 +309,11 @@ def sync(config: Optional[str]):
         
         # Initialize components
         watcher = DatabaseWatcher(somatic_config)
-        embedder = Embedder(api_key, somatic_config.embeddings.model)
+        embedder = Embedder(
+            api_key,
+            somatic_config.embeddings.model,
+            cache=EmbeddingCache(get_cache_path())
+        )
         
         # Determine vector size (text-embedding-3-small is 1536)
         vector_size = 1536
@@ -136,21 +323,15 @@ def sync(config: Optional[str]):
             vector_size
         )
         
-        # Fetch all rows
+        # Stream rows from a server-side cursor; the planner estimate sizes the progress bar
         console.print("[cyan]Fetching all rows...[/cyan]")
+        estimated_rows = watcher.estimate_row_count()
         rows = watcher.fetch_all_rows()
         
-        if not rows:
-            console.print("[yellow]No rows found to sync[/yellow]")
-            watcher.close()
-            return
-        
-        console.print(f"[green]Found {len(rows)} rows to sync[/green]")
+        if estimated_rows:
+            console.print(f"[green]Found ~{estimated_rows} rows to sync[/green]")
         
         # Process rows with progress bar
-        failed_rows = []
-        points = []
-        
         with Progress(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
@@ -159,60 +340,37 @@ def sync(config: Optional[str]):
             TimeElapsedColumn(),
             console=console
         ) as progress:
-            task = progress.add_task("Syncing rows...", total=len(rows))
-            
-            for row in rows:
-                try:
-                    # Format row for embedding
-                    text_to_embed = watcher.format_row_for_embedding(row)
-                    
-                    # Generate embedding
-                    embedding = embedder.embed(text_to_embed)
-                    
-                    # Create point
-                    primary_key = row[somatic_config.watch.primary_key]
-                    point = PointStruct(
-                        id=primary_key,
-                        vector=embedding,
-                        payload={
-                            "row_id": primary_key,
-                            **{col: row.get(col) for col in somatic_config.watch.columns},
-                            "timestamp": row.get(somatic_config.watch.updated_at_column)
-                        }
-                    )
-                    points.append(point)
-                    
-                    # Batch upsert every 100 points
-                    if len(points) >= 100:
-                        storage.upsert(points)
-                        points = []
-                    
-                except Exception as e:
-                    logger.error(f"Failed to process row {row.get(somatic_config.watch.primary_key)}: {e}")
-                    failed_rows.append(row)
-                
-                progress.update(task, advance=1)
+            task = progress.add_task("Syncing rows...", total=estimated_rows)
             
-            # Upsert remaining points
-            if points:
-                storage.upsert(points)
+            total_rows, failed_rows, last_row = asyncio.run(run_sync_pipeline(
+                rows,
+                watcher,
+                embedder,
+                storage,
+                somatic_config,
+                on_progress=lambda count: progress.update(task, advance=count)
+            ))
+            progress.update(task, total=total_rows)
         
         watcher.close()
         
+        if not total_rows:
+            console.print("[yellow]No rows found to sync[/yellow]")
+            return
+        
         if failed_rows:
             console.print(f"[yellow]Warning: {len(failed_rows)} rows failed to process[/yellow]")
         
-        console.print(f"[green]✓[/green] Successfully synced {len(rows) - len(failed_rows)} rows")
+        console.print(f"[green]✓[/green] Successfully synced {total_rows - len(failed_rows)} rows")
         
         # Update state with latest timestamp
-        if rows:
-            latest_timestamp = rows[-1].get(somatic_config.watch.updated_at_column)
-            if latest_timestamp:
-                state = WatcherState(
-                    last_sync_timestamp=str(latest_timestamp),
-                    last_sync_id=rows[-1].get(somatic_config.watch.primary_key)
-                )
-                save_state(state)
+        latest_timestamp = last_row.get(somatic_config.watch.updated_at_column)
+        if latest_timestamp:
+            state = WatcherState(
+                last_sync_timestamp=str(latest_timestamp),
+                last_sync_id=last_row.get(somatic_config.watch.primary_key)
+            )
+            save_state(state)
         
     except Exception as e:
         console.print(f"[red]ERROR:[/red] {e}")
@@ -237,7 +395,11 @@ def watch(config: Optional[str], interval: int):
         
         # Initialize components
         watcher = DatabaseWatcher(somatic_config)
-        embedder = Embedder(api_key, somatic_config.embeddings.model)
+        embedder = Embedder(
+            api_key,
+            somatic_config.embeddings.model,
+            cache=EmbeddingCache(get_cache_path())
+        )
         
         vector_size = 1536
         storage = Storage(
@@ -249,60 +411,50 @@ def watch(config: Optional[str], interval: int):
         console.print(f"[cyan]Watching for changes (polling every {interval}s)...[/cyan]")
         console.print("[dim]Press Ctrl+C to stop[/dim]\n")
         
+        # Keep state in memory and flush it to disk at most once per second
+        state = load_state()
+        state_dirty = False
+        last_flush = time.monotonic()
+        
         try:
             while True:
-                # Load current state
-                state = load_state()
-                
-                # Fetch new rows
-                new_rows = watcher.fetch_new_rows(state.last_sync_timestamp)
+                # Stream new rows and handle them a batch at a time
+                new_rows = watcher.fetch_new_rows(state.last_sync_timestamp, state.last_sync_id)
+                found = 0
                 
-                if new_rows:
-                    console.print(f"[green]Found {len(new_rows)} new/updated rows[/green]")
+                while batch := list(itertools.islice(new_rows, WATCH_BATCH_SIZE)):
+                    found += len(batch)
+                    console.print(f"[green]Found {len(batch)} new/updated rows[/green]")
                     
-                    points = []
-                    for row in new_rows:
-                        try:
-                            # Format row for embedding
-                            text_to_embed = watcher.format_row_for_embedding(row)
-                            
-                            # Generate embedding
-                            embedding = embedder.embed(text_to_embed)
-                            
-                            # Create point
-                            primary_key = row[somatic_config.watch.primary_key]
-                            point = PointStruct(
-                                id=primary_key,
-                                vector=embedding,
-                                payload={
-                                    "row_id": primary_key,
-                                    **{col: row.get(col) for col in somatic_config.watch.columns},
-                                    "timestamp": row.get(somatic_config.watch.updated_at_column)
-                                }
-                            )
-                            points.append(point)
-                        except Exception as e:
-                            logger.error(f"Failed to process row {row.get(somatic_config.watch.primary_key)}: {e}")
+                    processed, skipped = process_changed_rows(batch, watcher, embedder, storage, somatic_config)
+                    if processed:
+                        console.print(f"[green]✓[/green] Processed {processed} rows")
+                    if skipped:
+                        console.print(f"[dim]Skipped {skipped} unchanged rows[/dim]")
                     
-                    # Upsert points
-                    if points:
-                        storage.upsert(points)
-                        console.print(f"[green]✓[/green] Processed {len(points)} rows")
-                        
+                    if processed or skipped:
                         # Update state with latest timestamp
-                        latest_timestamp = new_rows[-1].get(somatic_config.watch.updated_at_column)
+                        latest_timestamp = batch[-1].get(somatic_config.watch.updated_at_column)
                         if latest_timestamp:
                             state.last_sync_timestamp = str(latest_timestamp)
-                            state.last_sync_id = new_rows[-1].get(somatic_config.watch.primary_key)
-                            save_state(state)
-                else:
+                            state.last_sync_id = batch[-1].get(somatic_config.watch.primary_key)
+                            state_dirty = True
+                
+                if not found:
                     console.print("[dim]No changes detected[/dim]", end="\r")
                 
+                if state_dirty and time.monotonic() - last_flush > 1.0:
+                    save_state(state)
+                    state_dirty = False
+                    last_flush = time.monotonic()
+                
                 time.sleep(interval)
         
         except KeyboardInterrupt:
             console.print("\n[yellow]Stopping watcher...[/yellow]")
         finally:
+            if state_dirty:
+                save_state(state)
             watcher.close()
     
     except Exception as e:
@@ -328,7 +480,11 @@ def query(search: str, config: Optional[str], limit: int):
             raise click.Abort()
         
         # Initialize components
-        embedder = Embedder(api_key, somatic_config.embeddings.model)
+        embedder = Embedder(
+            api_key,
+            somatic_config.embeddings.model,
+            cache=EmbeddingCache(get_cache_path())
+        )
         vector_size = 1536
         storage = Storage(
             somatic_config.storage.qdrant_path,
@@ -1,5 +1,6 @@
 """Configuration loading and validation"""
 
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 import yaml
@@ -7,6 +8,9 @@ from loguru import logger
 
 from .models import SomaticConfig
 
+# Use the libyaml-backed loader when available
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 
 def load_config(config_path: Optional[str] = None) -> SomaticConfig:
     """Load and validate configuration from somatic.yml"""
@@ -19,11 +23,17 @@ def load_config(config_path: Optional[str] = None) -> SomaticConfig:
         logger.error(f"Configuration file not found: {config_path}")
         raise FileNotFoundError(f"Configuration file not found: {config_path}")
     
+    return _load_config_cached(str(config_path.resolve()))
+
+
+@lru_cache(maxsize=4)
+def _load_config_cached(config_path: str) -> SomaticConfig:
+    """Parse and validate a configuration file once per resolved path"""
     logger.info(f"Loading configuration from {config_path}")
     
     try:
         with open(config_path, 'r') as f:
-            config_data = yaml.safe_load(f)
+            config_data = yaml.load(f, Loader=_YAML_LOADER)
         
         config = SomaticConfig(**config_data)
         logger.info("Configuration loaded and validated successfully")
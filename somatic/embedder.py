@@ -1,56 +1,161 @@
 """Embedding generation with OpenAI and retry logic"""
 
 import os
-import time
-from typing import List
-from openai import OpenAI
+import asyncio
+from typing import List, Optional, Tuple
+import httpx
+import numpy as np
+from openai import OpenAI, AsyncOpenAI
 from loguru import logger
 
+from .embedding_cache import EmbeddingCache
+
+
+OPENAI_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+
+# One pooled HTTP/2 client per process so every Embedder reuses warm connections.
+# Request timeouts are set per Embedder, since the OpenAI client passes its own on every call
+_OPENAI_HTTP = httpx.Client(http2=True, limits=OPENAI_LIMITS)
+
+
+def _unit_vector(values: List[float]) -> np.ndarray:
+    """Convert an embedding to an L2-normalized float32 array, so cosine is a plain dot product"""
+    vector = np.asarray(values, dtype=np.float32)
+    vector /= np.linalg.norm(vector) + 1e-12
+    return vector
+
 
 class Embedder:
     """Handles embedding generation with retry logic"""
     
-    def __init__(self, api_key: str, model: str = "text-embedding-3-small"):
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "text-embedding-3-small",
+        max_concurrency: int = 8,
+        cache: Optional[EmbeddingCache] = None
+    ):
         """Initialize embedder with OpenAI client"""
-        self.client = OpenAI(api_key=api_key)
-        self.model = model
+        # The OpenAI client retries with exponential backoff on its own
         self.max_retries = 3
-        self.base_delay = 1.0
+        # Read here rather than at import so a value from .env (loaded by the CLI) applies
+        timeout = float(os.getenv("OPENAI_TIMEOUT", "30"))
+        self.client = OpenAI(
+            api_key=api_key,
+            http_client=_OPENAI_HTTP,
+            max_retries=self.max_retries,
+            timeout=timeout
+        )
+        self.async_client = AsyncOpenAI(
+            api_key=api_key,
+            http_client=httpx.AsyncClient(http2=True, limits=OPENAI_LIMITS),
+            max_retries=self.max_retries,
+            timeout=timeout
+        )
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.cache = cache
     
-    def embed(self, text: str) -> List[float]:
-        """Generate embedding for a single text with retry logic"""
-        for attempt in range(self.max_retries):
-            try:
-                response = self.client.embeddings.create(
-                    model=self.model,
-                    input=text
-                )
-                embedding = response.data[0].embedding
-                logger.debug(f"Generated embedding (dimension: {len(embedding)})")
-                return embedding
-            except Exception as e:
-                if attempt < self.max_retries - 1:
-                    delay = self.base_delay * (2 ** attempt)
-                    logger.warning(f"Embedding attempt {attempt + 1} failed: {e}. Retrying in {delay}s...")
-                    time.sleep(delay)
-                else:
-                    logger.error(f"Failed to generate embedding after {self.max_retries} attempts: {e}")
-                    raise
+    async def aclose(self):
+        """Close the async client's connections"""
+        await self.async_client.close()
+    
+    def _lookup(self, texts: List[str]) -> Tuple[List[Optional[np.ndarray]], List[int]]:
+        """Return cached embeddings for texts and the indices that missed"""
+        if self.cache is None:
+            return [None] * len(texts), list(range(len(texts)))
+        embeddings = self.cache.get_many(self.model, texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        return embeddings, missing
     
-    def embed_batch(self, texts: List[str], batch_size: int = 100) -> List[List[float]]:
-        """Generate embeddings for a batch of texts"""
+    def _fill(self, texts: List[str], embeddings: List[Optional[np.ndarray]], missing: List[int], fresh: List[np.ndarray]):
+        """Merge freshly generated embeddings into the result and the cache"""
+        for i, embedding in zip(missing, fresh):
+            embeddings[i] = embedding
+        if self.cache is not None and missing:
+            self.cache.set_many(self.model, [texts[i] for i in missing], fresh)
+    
+    def embed(self, text: str) -> np.ndarray:
+        """Generate embedding for a single text"""
+        if self.cache is not None:
+            cached = self.cache.get(self.model, text)
+            if cached is not None:
+                return cached
+        
+        try:
+            response = self.client.embeddings.create(
+                model=self.model,
+                input=text
+            )
+        except Exception as e:
+            logger.error(f"Failed to generate embedding after {self.max_retries} retries: {e}")
+            raise
+        
+        embedding = _unit_vector(response.data[0].embedding)
+        logger.debug(f"Generated embedding (dimension: {len(embedding)})")
+        if self.cache is not None:
+            self.cache.set_many(self.model, [text], [embedding])
+        return embedding
+    
+    def embed_batch(self, texts: List[str], batch_size: int = 100) -> List[np.ndarray]:
+        """Generate embeddings for a batch of texts, reusing cached ones"""
+        embeddings, missing = self._lookup(texts)
+        if missing:
+            fresh = self._request_batch([texts[i] for i in missing], batch_size)
+            self._fill(texts, embeddings, missing, fresh)
+        return embeddings
+    
+    async def aembed_batch(self, texts: List[str], batch_size: int = 100) -> List[np.ndarray]:
+        """Generate embeddings for a batch of texts with concurrent requests, reusing cached ones"""
+        embeddings, missing = self._lookup(texts)
+        if missing:
+            fresh = await self._arequest_batch([texts[i] for i in missing], batch_size)
+            self._fill(texts, embeddings, missing, fresh)
+        return embeddings
+    
+    def _request_batch(self, texts: List[str], batch_size: int) -> List[np.ndarray]:
+        """Request embeddings for a batch of texts"""
         embeddings = []
         total = len(texts)
         
         for i in range(0, total, batch_size):
             batch = texts[i:i + batch_size]
-            logger.info(f"Processing batch {i // batch_size + 1} ({len(batch)} texts)")
+            logger.debug(f"Processing batch {i // batch_size + 1} ({len(batch)} texts)")
             
-            batch_embeddings = []
-            for text in batch:
-                embedding = self.embed(text)
-                batch_embeddings.append(embedding)
+            # One request per batch; the API returns embeddings in input order
+            try:
+                response = self.client.embeddings.create(
+                    model=self.model,
+                    input=batch
+                )
+            except Exception as e:
+                logger.error(f"Failed to generate batch embeddings after {self.max_retries} retries: {e}")
+                raise
             
-            embeddings.extend(batch_embeddings)
+            embeddings.extend(_unit_vector(d.embedding) for d in response.data)
+        
+        return embeddings
+    
+    async def _arequest_batch(self, texts: List[str], batch_size: int) -> List[np.ndarray]:
+        """Request embeddings for a batch of texts with concurrent requests"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        embeddings: List[np.ndarray] = [None] * len(texts)
+        
+        async def embed_chunk(offset: int):
+            batch = texts[offset:offset + batch_size]
+            async with semaphore:
+                logger.debug(f"Processing batch {offset // batch_size + 1} ({len(batch)} texts)")
+                try:
+                    response = await self.async_client.embeddings.create(
+                        model=self.model,
+                        input=batch
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to generate batch embeddings after {self.max_retries} retries: {e}")
+                    raise
+            # Write back by offset so results keep input order
+            for j, d in enumerate(response.data):
+                embeddings[offset + j] = _unit_vector(d.embedding)
         
+        await asyncio.gather(*(embed_chunk(i) for i in range(0, len(texts), batch_size)))
         return embeddings
@@ -0,0 +1,96 @@
+"""On-disk cache of generated embeddings"""
+
+import hashlib
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+
+# Stay under SQLite's default limit on bound parameters per statement
+LOOKUP_CHUNK_SIZE = 500
+
+# Entries kept before the least recently used are evicted (~6 KB each at 1536 dimensions)
+MAX_CACHE_ROWS = 50_000
+
+
+class EmbeddingCache:
+    """SQLite-backed LRU cache of embeddings keyed by a hash of model and text"""
+    
+    def __init__(self, path: Path, max_rows: int = MAX_CACHE_ROWS):
+        """Open (or create) the cache database"""
+        self.path = Path(path)
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        self.max_rows = max_rows
+        self.conn = sqlite3.connect(str(self.path))
+        # Keys are random hashes, so a clustered WITHOUT ROWID table saves a
+        # second b-tree lookup and the rowid index it would otherwise keep
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS emb (hash BLOB PRIMARY KEY, vec BLOB, last_used INTEGER) WITHOUT ROWID"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS emb_last_used ON emb (last_used)")
+        self.conn.commit()
+        self._rows = self.conn.execute("SELECT COUNT(*) FROM emb").fetchone()[0]
+    
+    @staticmethod
+    def make_key(model: str, text: str) -> bytes:
+        """Hash model and text into a cache key"""
+        return hashlib.blake2b((model + "\0" + text).encode(), digest_size=32).digest()
+    
+    def get(self, model: str, text: str) -> Optional[np.ndarray]:
+        """Return the cached embedding for a text, if any"""
+        return self.get_many(model, [text])[0]
+    
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Return cached embeddings for texts, with None for each miss"""
+        keys = [self.make_key(model, text) for text in texts]
+        found: Dict[bytes, bytes] = {}
+        for i in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+            chunk = keys[i:i + LOOKUP_CHUNK_SIZE]
+            placeholders = ", ".join("?" * len(chunk))
+            found.update(self.conn.execute(
+                f"SELECT hash, vec FROM emb WHERE hash IN ({placeholders})", chunk
+            ))
+        
+        if found:
+            # Mark hits as recently used so eviction keeps them
+            now = int(time.time())
+            self.conn.executemany("UPDATE emb SET last_used = ? WHERE hash = ?", [(now, key) for key in found])
+            self.conn.commit()
+        
+        return [
+            np.frombuffer(found[key], dtype=np.float32) if key in found else None
+            for key in keys
+        ]
+    
+    def set_many(self, model: str, texts: List[str], embeddings: List[np.ndarray]):
+        """Store embeddings for the given texts, evicting the least recently used past max_rows"""
+        now = int(time.time())
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO emb (hash, vec, last_used) VALUES (?, ?, ?)",
+            [
+                (self.make_key(model, text), np.asarray(embedding, dtype=np.float32).tobytes(), now)
+                for text, embedding in zip(texts, embeddings)
+            ]
+        )
+        # Replaced keys make this an overestimate; the count is refreshed when trimming
+        self._rows += len(texts)
+        if self._rows > self.max_rows:
+            self._trim()
+        self.conn.commit()
+    
+    def _trim(self):
+        """Delete the least recently used entries down to 90% of max_rows"""
+        self._rows = self.conn.execute("SELECT COUNT(*) FROM emb").fetchone()[0]
+        excess = self._rows - int(self.max_rows * 0.9)
+        if self._rows <= self.max_rows or excess <= 0:
+            return
+        self.conn.execute(
+            "DELETE FROM emb WHERE hash IN (SELECT hash FROM emb ORDER BY last_used LIMIT ?)",
+            (excess,)
+        )
+        self._rows -= excess
+    
+    def close(self):
+        """Close the cache database"""
+        self.conn.close()
@@ -1,5 +1,6 @@
 """Pydantic models for Somatic configuration and data structures"""
 
+from dataclasses import dataclass
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel, Field, field_validator
 
@@ -53,7 +54,8 @@ class SomaticConfig(BaseModel):
         return v
 
 
-class WatcherState(BaseModel):
+@dataclass(slots=True)
+class WatcherState:
     """State tracking for the watcher"""
     last_sync_timestamp: Optional[str] = None
     last_sync_id: Optional[int] = None
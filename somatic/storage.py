@@ -2,10 +2,14 @@
 
 from pathlib import Path
 from typing import List, Dict, Any, Optional
+import numpy as np
 from qdrant_client import QdrantClient
 from qdrant_client.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue
 from loguru import logger
 
+# Points sent per upsert request
+UPSERT_BATCH_SIZE = 256
+
 
 class Storage:
     """Handles Qdrant storage operations"""
@@ -18,7 +22,8 @@ class Storage:
         self.vector_size = vector_size
         
         logger.info(f"Initializing Qdrant at {self.qdrant_path}")
-        self.client = QdrantClient(path=str(self.qdrant_path))
+        # Upserts may run from a worker thread (see cli.run_sync_pipeline)
+        self.client = QdrantClient(path=str(self.qdrant_path), force_disable_check_same_thread=True)
         
         # Create collection if it doesn't exist
         self._ensure_collection()
@@ -45,67 +50,52 @@ class Storage:
             return
         
         try:
-            self.client.upsert(
-                collection_name=self.collection_name,
-                points=points
-            )
+            for i in range(0, len(points), UPSERT_BATCH_SIZE):
+                self.client.upsert(
+                    collection_name=self.collection_name,
+                    points=points[i:i + UPSERT_BATCH_SIZE]
+                )
             logger.debug(f"Upserted {len(points)} points")
         except Exception as e:
             logger.error(f"Failed to upsert points: {e}")
             raise
     
-    def search(self, query_vector: List[float], limit: int = 5, filter_dict: Optional[Dict[str, Any]] = None) -> List[Any]:
+    def get_content_hashes(self, ids: List[int]) -> Dict[Any, Optional[str]]:
+        """Return the stored content_sha payload for each existing point ID"""
+        if not ids:
+            return {}
+        
+        try:
+            points = self.client.retrieve(
+                collection_name=self.collection_name,
+                ids=ids,
+                with_payload=["content_sha"],
+                with_vectors=False
+            )
+            return {point.id: (point.payload or {}).get("content_sha") for point in points}
+        except Exception as e:
+            logger.error(f"Failed to retrieve content hashes: {e}")
+            raise
+    
+    def search(self, query_vector: np.ndarray, limit: int = 5, filter_dict: Optional[Dict[str, Any]] = None) -> List[Any]:
         """Search for similar vectors"""
-        import math
+        query_filter = None
+        if filter_dict:
+            conditions = []
+            for key, value in filter_dict.items():
+                conditions.append(
+                    FieldCondition(key=key, match=MatchValue(value=value))
+                )
+            query_filter = Filter(must=conditions)
         
         try:
-            # For local/embedded mode, Qdrant doesn't have search() method
-            # Use scroll() to get all points and calculate cosine similarity manually
-            scroll_filter = None
-            if filter_dict:
-                conditions = []
-                for key, value in filter_dict.items():
-                    conditions.append(
-                        FieldCondition(key=key, match=MatchValue(value=value))
-                    )
-                scroll_filter = Filter(must=conditions)
-            
-            # Get all points with vectors
-            all_points = self.client.scroll(
+            return self.client.query_points(
                 collection_name=self.collection_name,
-                limit=10000,  # Large limit to get all points
-                with_vectors=True,
-                with_payload=True,
-                scroll_filter=scroll_filter
-            )[0]
-            
-            # Calculate cosine similarity manually
-            def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
-                """Calculate cosine similarity between two vectors"""
-                dot_product = sum(a * b for a, b in zip(vec1, vec2))
-                magnitude1 = math.sqrt(sum(a * a for a in vec1))
-                magnitude2 = math.sqrt(sum(a * a for a in vec2))
-                return dot_product / (magnitude1 * magnitude2) if magnitude1 * magnitude2 > 0 else 0.0
-            
-            # Score all points
-            scored_points = []
-            for point in all_points:
-                if point.vector:
-                    score = cosine_similarity(query_vector, point.vector)
-                    # Create a result-like object with score attribute
-                    class ScoredPoint:
-                        def __init__(self, point, score):
-                            self.id = point.id
-                            self.score = score
-                            self.payload = point.payload if hasattr(point, 'payload') else {}
-                            self.vector = point.vector if hasattr(point, 'vector') else None
-                    
-                    scored_points.append(ScoredPoint(point, score))
-            
-            # Sort by score (highest first) and return top N
-            scored_points.sort(key=lambda x: x.score, reverse=True)
-            return scored_points[:limit]
-            
+                query=query_vector,
+                query_filter=query_filter,
+                limit=limit,
+                with_payload=True
+            ).points
         except Exception as e:
             logger.error(f"Failed to search: {e}")
             raise
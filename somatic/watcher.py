@@ -1,12 +1,24 @@
 """Postgres database watcher and data fetching"""
 
+import time
+import uuid
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from typing import List, Dict, Any, Optional
+from psycopg2 import sql
+import tiktoken
+from typing import Iterator, List, Dict, Any, Optional
 from loguru import logger
 
 from .models import SomaticConfig, WatcherState
 
+# Embedding models reject inputs over 8191 tokens; stay safely below that
+MAX_EMBEDDING_TOKENS = 8000
+
+# Rows fetched per round trip by the server-side cursors
+FETCH_ITERSIZE = 1000
+
+# Connection attempts before giving up, with exponential backoff between them
+CONNECT_RETRIES = 3
+
 
 class DatabaseWatcher:
     """Watches Postgres database for changes"""
@@ -15,23 +27,87 @@ class DatabaseWatcher:
         """Initialize database connection"""
         self.config = config
         self.conn = None
+        
+        # The watched table never changes for a watcher, so compose its queries once.
+        # Identifiers come from somatic.yml and are quoted rather than interpolated
+        watch = config.watch
+        self._columns = [watch.primary_key] + watch.columns + [watch.updated_at_column]
+        # Allow schema-qualified tables such as public.documents
+        self._table = sql.Identifier(*watch.table.split("."))
+        select = sql.SQL("SELECT {columns} FROM {table}").format(
+            columns=sql.SQL(", ").join(sql.Identifier(col) for col in self._columns),
+            table=self._table
+        )
+        primary_key = sql.Identifier(watch.primary_key)
+        updated_at = sql.Identifier(watch.updated_at_column)
+        
+        self._fetch_all_sql = sql.SQL("{select} ORDER BY {pk}").format(select=select, pk=primary_key)
+        # Keyset pages over (updated_at, primary key), served by a composite index on both
+        page_order = sql.SQL("ORDER BY {updated_at}, {pk} LIMIT %s").format(updated_at=updated_at, pk=primary_key)
+        self._fetch_delta_sql = sql.SQL("{select} WHERE ({updated_at}, {pk}) > (%s, %s) {order}").format(
+            select=select, updated_at=updated_at, pk=primary_key, order=page_order
+        )
+        self._fetch_since_sql = sql.SQL("{select} WHERE {updated_at} > %s {order}").format(
+            select=select, updated_at=updated_at, order=page_order
+        )
+        self._fetch_initial_sql = sql.SQL("{select} {order}").format(select=select, order=page_order)
+        
+        # Resolve embedding columns and template once for format_rows
+        self._cols = tuple(watch.columns)
+        template = config.embeddings.template
+        self._tpl = template if template and "{columns}" in template else None
+        
+        self._encoding = self._load_encoding(config.embeddings.model)
         self._connect()
     
     def _connect(self):
-        """Establish database connection"""
+        """Establish database connection, retrying transient failures with backoff"""
         source = self.config.source
-        try:
-            self.conn = psycopg2.connect(
-                host=source.host,
-                port=source.port,
-                database=source.database,
-                user=source.user,
-                password=source.password
-            )
-            logger.info(f"Connected to Postgres at {source.host}:{source.port}/{source.database}")
-        except Exception as e:
-            logger.error(f"Failed to connect to Postgres: {e}")
-            raise
+        for attempt in range(CONNECT_RETRIES):
+            try:
+                self.conn = psycopg2.connect(
+                    host=source.host,
+                    port=source.port,
+                    database=source.database,
+                    user=source.user,
+                    password=source.password,
+                    application_name="somatic-watcher",
+                    # TCP keepalives stop idle NATs and firewalls from silently dropping a long-lived watcher
+                    keepalives=1,
+                    keepalives_idle=30,
+                    keepalives_interval=10,
+                    keepalives_count=3
+                )
+                logger.info(f"Connected to Postgres at {source.host}:{source.port}/{source.database}")
+                return
+            except psycopg2.OperationalError as e:
+                if attempt == CONNECT_RETRIES - 1:
+                    logger.error(f"Failed to connect to Postgres: {e}")
+                    raise
+                delay = 2 ** attempt
+                logger.warning(f"Failed to connect to Postgres, retrying in {delay}s: {e}")
+                time.sleep(delay)
+            except Exception as e:
+                logger.error(f"Failed to connect to Postgres: {e}")
+                raise
+    
+    def _fetch_page(self, query: sql.Composable, params: tuple) -> List[tuple]:
+        """Run a page query, reconnecting once if the connection was dropped"""
+        for attempt in range(2):
+            if self.conn.closed:
+                self._connect()
+            try:
+                with self.conn.cursor() as cur:
+                    cur.execute(query, params)
+                    rows = cur.fetchall()
+                # End the read transaction so the session never sits idle in one between polls
+                self.conn.commit()
+                return rows
+            except psycopg2.OperationalError as e:
+                if attempt:
+                    raise
+                logger.warning(f"Lost connection to Postgres, reconnecting: {e}")
+                self.conn.close()
     
     def close(self):
         """Close database connection"""
@@ -39,71 +115,139 @@ class DatabaseWatcher:
             self.conn.close()
             logger.debug("Database connection closed")
     
-    def fetch_all_rows(self) -> List[Dict[str, Any]]:
-        """Fetch all rows from the watched table"""
-        watch = self.config.watch
-        columns_str = ", ".join([watch.primary_key] + watch.columns + [watch.updated_at_column])
-        
-        query = f"SELECT {columns_str} FROM {watch.table} ORDER BY {watch.primary_key}"
-        
+    def estimate_row_count(self) -> Optional[int]:
+        """Estimate the number of rows in the watched table from planner statistics"""
         try:
-            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute(query)
-                rows = cur.fetchall()
-                logger.info(f"Fetched {len(rows)} rows from {watch.table}")
-                return [dict(row) for row in rows]
+            with self.conn.cursor() as cur:
+                # Resolve the table from the same quoted name the fetch queries use
+                cur.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    (self._table.as_string(self.conn),)
+                )
+                row = cur.fetchone()
+        except Exception as e:
+            logger.warning(f"Failed to estimate row count: {e}")
+            self.conn.rollback()
+            return None
+        # reltuples is -1 (or 0) until the table has been analyzed
+        if not row or row[0] <= 0:
+            return None
+        return row[0]
+    
+    def _stream(self, query: sql.Composable, params: Optional[tuple] = None) -> Iterator[Dict[str, Any]]:
+        """Yield rows for a query through a server-side cursor, FETCH_ITERSIZE rows per round trip"""
+        columns = self._columns
+        if self.conn.closed:
+            self._connect()
+        # Named cursors must be unique per connection while open
+        with self.conn.cursor(name=f"somatic_{uuid.uuid4().hex}") as cur:
+            cur.itersize = FETCH_ITERSIZE
+            cur.execute(query, params)
+            for row in cur:
+                yield dict(zip(columns, row))
+    
+    def fetch_all_rows(self) -> Iterator[Dict[str, Any]]:
+        """Stream all rows from the watched table through a server-side cursor"""
+        try:
+            count = 0
+            for row in self._stream(self._fetch_all_sql):
+                count += 1
+                yield row
+            logger.info(f"Fetched {count} rows from {self.config.watch.table}")
         except Exception as e:
             logger.error(f"Failed to fetch rows: {e}")
             raise
     
-    def fetch_new_rows(self, last_timestamp: Optional[str] = None, last_id: Optional[int] = None) -> List[Dict[str, Any]]:
-        """Fetch rows that have been updated since last_timestamp"""
+    def fetch_new_rows(
+        self,
+        last_timestamp: Optional[str] = None,
+        last_id: Optional[int] = None,
+        batch_size: int = 1000
+    ) -> Iterator[Dict[str, Any]]:
+        """Stream rows updated after (last_timestamp, last_id), one keyset page at a time"""
         watch = self.config.watch
-        columns_str = ", ".join([watch.primary_key] + watch.columns + [watch.updated_at_column])
+        columns = self._columns
         
-        if last_timestamp:
-            query = f"""
-                SELECT {columns_str}
-                FROM {watch.table}
-                WHERE {watch.updated_at_column} > %s
-                ORDER BY {watch.updated_at_column}
-            """
-            params = (last_timestamp,)
-        else:
-            # If no timestamp, fetch all (initial sync case)
-            query = f"SELECT {columns_str} FROM {watch.table} ORDER BY {watch.updated_at_column}"
-            params = None
+        # An empty saved timestamp means nothing has been synced yet
+        last_timestamp = last_timestamp or None
         
         try:
-            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
-                if params:
-                    cur.execute(query, params)
+            count = 0
+            while True:
+                if last_timestamp is None:
+                    # If no timestamp, fetch all (initial sync case)
+                    query, params = self._fetch_initial_sql, (batch_size,)
+                elif last_id is None:
+                    # State saved without a row ID: resume from the timestamp alone
+                    query, params = self._fetch_since_sql, (last_timestamp, batch_size)
                 else:
-                    cur.execute(query)
-                rows = cur.fetchall()
-                logger.debug(f"Fetched {len(rows)} new rows from {watch.table}")
-                return [dict(row) for row in rows]
+                    query, params = self._fetch_delta_sql, (last_timestamp, last_id, batch_size)
+                
+                page = [dict(zip(columns, row)) for row in self._fetch_page(query, params)]
+                
+                count += len(page)
+                yield from page
+                
+                # Rows without a timestamp sort last and cannot be paged past
+                if len(page) < batch_size or page[-1][watch.updated_at_column] is None:
+                    break
+                last_timestamp = page[-1][watch.updated_at_column]
+                last_id = page[-1][watch.primary_key]
+            
+            logger.debug(f"Fetched {count} new rows from {watch.table}")
         except Exception as e:
             logger.error(f"Failed to fetch new rows: {e}")
             raise
     
     def format_row_for_embedding(self, row: Dict[str, Any]) -> str:
         """Format a row into text for embedding"""
-        watch = self.config.watch
-        embeddings = self.config.embeddings
+        return self.format_rows_for_embedding([row])[0]
+    
+    def format_rows_for_embedding(self, rows: List[Dict[str, Any]]) -> List[str]:
+        """Format a batch of rows into texts for embedding"""
+        return self.truncate(self.format_rows(rows))
+    
+    def format_rows(self, rows: List[Dict[str, Any]]) -> List[str]:
+        """Format a batch of rows into their full, untruncated texts"""
+        cols = self._cols
+        tpl = self._tpl
         
-        # Extract column values
-        column_values = []
-        for col in watch.columns:
-            value = row.get(col, "")
-            if value:
-                column_values.append(str(value))
+        texts = []
+        for row in rows:
+            # Combine non-empty column values
+            combined = "\n".join(str(row[col]) for col in cols if row.get(col))
+            texts.append(tpl.format(columns=combined) if tpl else combined)
+        
+        return texts
+    
+    @staticmethod
+    def _load_encoding(model: str) -> Optional[tiktoken.Encoding]:
+        """Load the tokenizer for an embedding model, or None if it can't be fetched"""
+        try:
+            try:
+                return tiktoken.encoding_for_model(model)
+            except KeyError:
+                return tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            # tiktoken downloads its BPE file on first use, which fails on offline hosts
+            logger.warning(f"Failed to load tokenizer, embedding texts will not be truncated: {e}")
+            return None
+    
+    def truncate(self, texts: List[str]) -> List[str]:
+        """Trim texts to the embedding model's token limit so a batch is never rejected"""
+        encoding = self._encoding
+        if encoding is None:
+            return texts
         
-        # Combine columns
-        combined = "\n".join(column_values)
+        # Every token covers at least one byte, so shorter texts can't be over the limit
+        long = [i for i, text in enumerate(texts) if len(text.encode()) > MAX_EMBEDDING_TOKENS]
+        if not long:
+            return texts
         
-        # Apply template if provided
-        if embeddings.template and "{columns}" in embeddings.template:
-            return embeddings.template.format(columns=combined)
-        else:
-            return combined
+        texts = list(texts)
+        # Row text is data, so special-token strings like <|endoftext|> are encoded as plain text
+        encoded = encoding.encode_batch([texts[i] for i in long], disallowed_special=())
+        for i, tokens in zip(long, encoded):
+            if len(tokens) > MAX_EMBEDDING_TOKENS:
+                texts[i] = encoding.decode(tokens[:MAX_EMBEDDING_TOKENS])
+        return texts